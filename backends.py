@@ -0,0 +1,330 @@
+import random
+
+from board import Board
+from material import MaterialTypes, DriftTypes, get_material_data
+
+
+class SimulationBackend:
+    """
+    A way of advancing the board by one frame.
+
+    Backends must implement step(board, rng), which updates board.contents and
+    board.temps in place (or replaces them) to hold the next frame. All randomness
+    must be drawn from rng.
+
+    A backend that makes the same rng calls in the same order as the reference
+    backend (once per row, then per cell in its scan order) produces the same board,
+    and can be checked cell by cell with differential.py. Backends that scan in a
+    different order or vectorise their random draws cannot, and must be checked
+    with differential.py --order-independent, which is a weaker test.
+    """
+
+    """ Name used to select the backend at startup """
+    name: str = ""
+
+    def step(self, board: Board, rng: random.Random) -> None:
+        """Advance the board by one frame."""
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"{type(self).__name__}(name={self.name})"
+
+
+def _buffer_swap(
+    board: Board,
+    buffer: list[list[MaterialTypes]],
+    x1: int,
+    y1: int,
+    contents1: MaterialTypes,
+    x2: int,
+    y2: int,
+    contents2: MaterialTypes,
+) -> bool:
+    """
+    Swap two cells in the buffer ONLY IF CLEAN.
+    Returns False if the swap was not possible.
+    """
+    clean1 = (
+        buffer[y1][x1] == MaterialTypes.CLEAN
+    )  # or buffer[y1][x1] == Materials.NONE
+    clean2 = (
+        buffer[y2][x2] == MaterialTypes.CLEAN
+    )  # or buffer[y2][x2] == Materials.NONE
+    if not (clean1 and clean2):
+        return False
+    temp1 = board.get_temperature(x1, y1)
+    temp2 = board.get_temperature(x2, y2)
+    buffer[y1][x1] = contents2
+    board.temps[y1][x1] = temp2
+    buffer[y2][x2] = contents1
+    board.temps[y2][x2] = temp1
+    return True
+
+
+class ReferenceBackend(SimulationBackend):
+    """
+    The original pure-Python simulation.
+    Other backends are checked against this one, see differential.py.
+    """
+
+    name = "reference"
+
+    def step(self, board: Board, rng: random.Random) -> None:
+        """Update the board state for the next frame."""
+        width = board.width
+        height = board.height
+        # Hoisted out of the loops below, which look them up several times per cell
+        get_material_id_at = board.get_material_id_at
+        material_data = get_material_data
+        contents = board.contents
+        temps = board.temps
+        # Temperature conduction
+        # Each cell's conductivity is looked up once here rather than once per
+        # neighbor below, since material lookups dominate the cost of a tick
+        conductivities = [
+            [material_data(material_id).thermal_conductivity for material_id in row]
+            for row in contents
+        ]
+        edge_conductivity = material_data(MaterialTypes.EDGE).thermal_conductivity
+        temps_buffer = [[None for x in range(width)] for y in range(height)]
+        for y in range(height):
+            row = contents[y]
+            for x in range(width):
+                material_id = row[x]
+                if material_id == MaterialTypes.HEATER:
+                    temps_buffer[y][x] = 150.0
+                    continue
+                elif material_id == MaterialTypes.COOLER:
+                    temps_buffer[y][x] = -50.0
+                    continue
+                new_temp = temps[y][x]
+                divisor = 1.0
+                # 10% of the neighboring cells' temperatures are averaged in
+                for dx in range(-1, 2):
+                    neighbor_x = x + dx
+                    x_inside = 0 <= neighbor_x < width
+                    for dy in range(-1, 2):
+                        if dx == 0 and dy == 0:
+                            continue
+                        neighbor_y = y + dy
+                        # Neighbors outside the board behave like EDGE cells
+                        if x_inside and 0 <= neighbor_y < height:
+                            thermal_conductivity = conductivities[neighbor_y][
+                                neighbor_x
+                            ]
+                            if thermal_conductivity <= 0:
+                                continue
+                            neighbor_temp = temps[neighbor_y][neighbor_x]
+                        else:
+                            thermal_conductivity = edge_conductivity
+                            if thermal_conductivity <= 0:
+                                continue
+                            neighbor_temp = board.edge_temperature
+                        new_temp += neighbor_temp * thermal_conductivity
+                        divisor += thermal_conductivity
+                temps_buffer[y][x] = new_temp / divisor
+        board.temps = temps_buffer
+        # Melting and freezing
+        for y in range(height):
+            row = contents[y]
+            temps_row = temps_buffer[y]
+            for x in range(width):
+                old_material = material_data(row[x])
+                old_temperature = temps_row[x]
+                if old_material.melts_to is not None:
+                    if old_temperature >= old_material.melting_point:
+                        # Melt the material
+                        row[x] = old_material.melts_to
+                if old_material.freezes_to is not None:
+                    if old_temperature <= old_material.freezing_point:
+                        # Freeze the material
+                        row[x] = old_material.freezes_to
+        # Movement
+        buffer = [[MaterialTypes.CLEAN for _ in range(width)] for _ in range(height)]
+        for y in range(height):
+            left_or_right = rng.randint(0, 1)  # Randomly check left or right first
+            for x in (range(width) if left_or_right == 0 else range(width - 1, -1, -1)):
+                if buffer[y][x] != MaterialTypes.CLEAN:
+                    continue
+                old_material_id = get_material_id_at(x, y)
+                old_material = material_data(old_material_id)
+                below_material_id = get_material_id_at(x, y + 1)
+                below_material = material_data(below_material_id)
+                modified = False
+                if old_material.gravity:
+                    # If the material is denser than the one below, swap them
+                    if old_material.density > below_material.density:
+                        modified = _buffer_swap(
+                            board,
+                            buffer,
+                            x,
+                            y,
+                            old_material_id,
+                            x,
+                            y + 1,
+                            below_material_id,
+                        )
+                    else:
+                        if rng.random() > old_material.friction:
+                            if not modified and old_material.drift in [
+                                DriftTypes.DIAGONAL_DRIFT,
+                                DriftTypes.SIDEWAYS_DRIFT,
+                            ]:
+                                # Drift down diagonally if possible
+                                below_left_contents = get_material_id_at(x - 1, y + 1)
+                                below_right_contents = get_material_id_at(x + 1, y + 1)
+                                below_left_material = material_data(below_left_contents)
+                                below_right_material = material_data(
+                                    below_right_contents
+                                )
+                                # Randomly check left or right first
+                                if rng.randint(0, 1) == 0:
+                                    if (
+                                        below_left_material.density
+                                        < old_material.density
+                                    ):
+                                        modified = _buffer_swap(
+                                            board,
+                                            buffer,
+                                            x,
+                                            y,
+                                            old_material_id,
+                                            x - 1,
+                                            y + 1,
+                                            below_left_contents,
+                                        )
+                                    elif (
+                                        below_right_material.density
+                                        < old_material.density
+                                    ):
+                                        modified = _buffer_swap(
+                                            board,
+                                            buffer,
+                                            x,
+                                            y,
+                                            old_material_id,
+                                            x + 1,
+                                            y + 1,
+                                            below_right_contents,
+                                        )
+                                else:
+                                    if (
+                                        below_right_material.density
+                                        < old_material.density
+                                    ):
+                                        modified = _buffer_swap(
+                                            board,
+                                            buffer,
+                                            x,
+                                            y,
+                                            old_material_id,
+                                            x + 1,
+                                            y + 1,
+                                            below_right_contents,
+                                        )
+                                    elif (
+                                        below_left_material.density
+                                        < old_material.density
+                                    ):
+                                        modified = _buffer_swap(
+                                            board,
+                                            buffer,
+                                            x,
+                                            y,
+                                            old_material_id,
+                                            x - 1,
+                                            y + 1,
+                                            below_left_contents,
+                                        )
+                            if not modified and old_material.drift in [
+                                DriftTypes.SIDEWAYS_DRIFT
+                            ]:
+                                # Drift sideways if possible
+                                left_contents = get_material_id_at(x - 1, y)
+                                right_contents = get_material_id_at(x + 1, y)
+                                left_material = material_data(left_contents)
+                                right_material = material_data(right_contents)
+                                if rng.randint(0, 1) == 0:
+                                    if left_material.density < old_material.density:
+                                        modified = _buffer_swap(
+                                            board,
+                                            buffer,
+                                            x,
+                                            y,
+                                            old_material_id,
+                                            x - 1,
+                                            y,
+                                            left_contents,
+                                        )
+                                    elif right_material.density < old_material.density:
+                                        modified = _buffer_swap(
+                                            board,
+                                            buffer,
+                                            x,
+                                            y,
+                                            old_material_id,
+                                            x + 1,
+                                            y,
+                                            right_contents,
+                                        )
+                                else:
+                                    if right_material.density < old_material.density:
+                                        modified = _buffer_swap(
+                                            board,
+                                            buffer,
+                                            x,
+                                            y,
+                                            old_material_id,
+                                            x + 1,
+                                            y,
+                                            right_contents,
+                                        )
+                                    elif left_material.density < old_material.density:
+                                        modified = _buffer_swap(
+                                            board,
+                                            buffer,
+                                            x,
+                                            y,
+                                            old_material_id,
+                                            x - 1,
+                                            y,
+                                            left_contents,
+                                        )
+                # If nothing was modified, keep the old contents.
+                # Materials.NONE should still be clean to allow for later movements.
+                if not modified:
+                    buffer[y][x] = (
+                        old_material_id
+                        if old_material_id != MaterialTypes.CLEAN
+                        else MaterialTypes.CLEAN
+                    )
+
+        # Swap the buffers
+        board.contents = buffer
+
+
+# Backends that can be selected at startup, by name
+_backends: dict[str, SimulationBackend] = {}
+
+
+def register_backend(backend: SimulationBackend) -> SimulationBackend:
+    """Make a backend available for selection by its name."""
+    _backends[backend.name] = backend
+    return backend
+
+
+def get_backend(name: str) -> SimulationBackend:
+    """Retrieve the backend registered under the given name."""
+    if name not in _backends:
+        raise KeyError(
+            f"Unknown backend {name!r}, expected one of {', '.join(_backends)}"
+        )
+    return _backends[name]
+
+
+def get_backend_names() -> list[str]:
+    """List the names of all registered backends."""
+    return list(_backends)
+
+
+register_backend(ReferenceBackend())
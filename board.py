@@ -0,0 +1,50 @@
+from material import MaterialTypes
+
+
+class Board:
+    """
+    The state of the simulation: the material and temperature of every cell.
+    Notably, this is row-major for access, so contents[y][x] is the cell at (x, y).
+    """
+
+    """ The material in each cell """
+    contents: list[list[MaterialTypes]]
+    """ The temperature of each cell """
+    temps: list[list[float]]
+    """ The temperature reported for cells outside the board """
+    edge_temperature: float
+    """ The dimensions of the board in cells, fixed when the board is created """
+    width: int
+    height: int
+
+    def __init__(
+        self,
+        contents: list[list[MaterialTypes]],
+        temps: list[list[float]],
+        edge_temperature: float = 20.0,
+    ):
+        self.contents = contents
+        self.temps = temps
+        self.edge_temperature = edge_temperature
+        self.width = len(contents[0]) if contents else 0
+        self.height = len(contents)
+
+    def get_material_id_at(self, x: int, y: int) -> MaterialTypes:
+        """Get the material at the given coordinates."""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.contents[y][x]
+        return MaterialTypes.EDGE  # Return EDGE if out of bounds
+
+    def get_temperature(self, x: int, y: int) -> float:
+        """Get the temperature at the given coordinates."""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.temps[y][x]
+        return self.edge_temperature  # Return edge temperature if out of bounds
+
+    def copy(self) -> "Board":
+        """Return a copy of the board that shares no rows with this one."""
+        return Board(
+            [list(row) for row in self.contents],
+            [list(row) for row in self.temps],
+            self.edge_temperature,
+        )
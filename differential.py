@@ -0,0 +1,333 @@
+"""
+Differential testing for simulation backends.
+Runs a candidate backend alongside the reference backend from the same seeded
+starting boards and reports the first tick where they disagree.
+
+By default materials must match cell for cell, which only holds for backends that
+make the same rng calls in the same order as the reference. Backends that scan or
+draw randomness differently can be checked with --order-independent instead, which
+only compares what the rng cannot change: temperatures on a board where nothing
+moves, and the number of cells of each material on a board where nothing melts or
+freezes. That is a much weaker check.
+
+Usage: python differential.py <candidate> [--order-independent] [--seeds N] [--ticks N] [--tolerance T]
+       python differential.py --self-check   (checks that the harness catches broken backends)
+"""
+
+import argparse
+import math
+import random
+import sys
+from collections import Counter
+
+from backends import (
+    ReferenceBackend,
+    SimulationBackend,
+    get_backend,
+    get_backend_names,
+)
+from board import Board
+from material import MaterialTypes, get_material_data
+
+# Materials that may appear on a randomly generated starting board
+RANDOM_MATERIALS = [
+    material_type
+    for material_type in MaterialTypes
+    if material_type not in (MaterialTypes.CLEAN, MaterialTypes.EDGE)
+]
+
+# Materials that never melt or freeze, so only movement changes where they are
+STABLE_MATERIALS = [
+    material_type
+    for material_type in RANDOM_MATERIALS
+    if get_material_data(material_type).melts_to is None
+    and get_material_data(material_type).freezes_to is None
+]
+
+# Materials that never move when they are the only ones on the board.
+# NONE is affected by gravity, but nothing here is lighter than it.
+STATIC_MATERIALS = [
+    MaterialTypes.NONE,
+    MaterialTypes.WALL,
+    MaterialTypes.METAL,
+    MaterialTypes.HEATER,
+    MaterialTypes.COOLER,
+]
+
+
+class Divergence:
+    """The first difference found between two backends."""
+
+    def __init__(self, seed: int, tick: int, x: int, y: int, reason: str):
+        self.seed = seed
+        self.tick = tick
+        self.x = x
+        self.y = y
+        self.reason = reason
+
+    def __repr__(self):
+        return f"Divergence(seed={self.seed}, tick={self.tick}, x={self.x}, y={self.y}, reason={self.reason})"
+
+
+def make_random_board(
+    seed: int,
+    width: int,
+    height: int,
+    materials: list[MaterialTypes] = RANDOM_MATERIALS,
+) -> Board:
+    """Build a board of random materials, each at its starting temperature."""
+    layout_rng = random.Random(seed)
+    contents = [
+        [layout_rng.choice(materials) for _ in range(width)] for _ in range(height)
+    ]
+    temps = [
+        [get_material_data(material).starting_temperature for material in row]
+        for row in contents
+    ]
+    return Board(contents, temps)
+
+
+def compare_boards(
+    expected: Board, actual: Board, seed: int, tick: int, tolerance: float
+) -> Divergence | None:
+    """Compare materials exactly and temperatures to within the given absolute tolerance."""
+    if expected.width != actual.width or expected.height != actual.height:
+        return Divergence(
+            seed,
+            tick,
+            -1,
+            -1,
+            f"size {actual.width}x{actual.height}, expected {expected.width}x{expected.height}",
+        )
+    for y in range(expected.height):
+        for x in range(expected.width):
+            expected_material = expected.contents[y][x]
+            actual_material = actual.contents[y][x]
+            if expected_material != actual_material:
+                return Divergence(
+                    seed,
+                    tick,
+                    x,
+                    y,
+                    f"material {actual_material.name}, expected {expected_material.name}",
+                )
+            expected_temp = expected.temps[y][x]
+            actual_temp = actual.temps[y][x]
+            if not math.isclose(
+                expected_temp, actual_temp, rel_tol=0.0, abs_tol=tolerance
+            ):
+                return Divergence(
+                    seed,
+                    tick,
+                    x,
+                    y,
+                    f"temperature {actual_temp}, expected {expected_temp}",
+                )
+    return None
+
+
+def compare_counts(
+    expected: Board, actual: Board, seed: int, tick: int
+) -> Divergence | None:
+    """Compare how many cells hold each material, ignoring where they are."""
+    expected_counts = Counter(material for row in expected.contents for material in row)
+    actual_counts = Counter(material for row in actual.contents for material in row)
+    for material in expected_counts.keys() | actual_counts.keys():
+        if expected_counts[material] != actual_counts[material]:
+            return Divergence(
+                seed,
+                tick,
+                -1,
+                -1,
+                f"{actual_counts[material]} {material.name} cells, expected {expected_counts[material]}",
+            )
+    return None
+
+
+def _run(
+    reference: SimulationBackend,
+    candidate: SimulationBackend,
+    board: Board,
+    seed: int,
+    ticks: int,
+    tolerance: float,
+    compare_materials_exactly: bool,
+) -> Divergence | None:
+    """Step both backends from copies of the board, comparing after every tick."""
+    expected = board
+    actual = board.copy()
+    reference_rng = random.Random(seed)
+    candidate_rng = random.Random(seed)
+    for tick in range(1, ticks + 1):
+        reference.step(expected, reference_rng)
+        candidate.step(actual, candidate_rng)
+        if compare_materials_exactly:
+            divergence = compare_boards(expected, actual, seed, tick, tolerance)
+        else:
+            divergence = compare_counts(expected, actual, seed, tick)
+        if divergence is not None:
+            return divergence
+    return None
+
+
+def run_differential(
+    reference: SimulationBackend,
+    candidate: SimulationBackend,
+    seed: int,
+    ticks: int,
+    width: int = 32,
+    height: int = 32,
+    tolerance: float = 1e-6,
+) -> Divergence | None:
+    """
+    Step both backends from the same seeded board, comparing after every tick.
+    Returns the first divergence, or None if the backends agreed throughout.
+    """
+    board = make_random_board(seed, width, height)
+    return _run(reference, candidate, board, seed, ticks, tolerance, True)
+
+
+def run_order_independent(
+    reference: SimulationBackend,
+    candidate: SimulationBackend,
+    seed: int,
+    ticks: int,
+    width: int = 32,
+    height: int = 32,
+    tolerance: float = 1e-6,
+) -> Divergence | None:
+    """
+    Like run_differential, but only checks what does not depend on rng call order:
+    whole boards (temperatures included) on a board where nothing moves, then
+    material counts on a board where nothing changes phase.
+    """
+    board = make_random_board(seed, width, height, STATIC_MATERIALS)
+    divergence = _run(reference, candidate, board, seed, ticks, tolerance, True)
+    if divergence is not None:
+        return divergence
+    board = make_random_board(seed, width, height, STABLE_MATERIALS)
+    return _run(reference, candidate, board, seed, ticks, tolerance, False)
+
+
+class _BrokenBackend(ReferenceBackend):
+    """
+    The reference backend with a deliberate mistake in cell (0, 0) on one tick.
+    Used by self_check to prove the harness notices.
+    """
+
+    name = "broken"
+
+    def __init__(self, broken_tick: int, change_material: bool, temp_shift: float):
+        self.broken_tick = broken_tick
+        self.change_material = change_material
+        self.temp_shift = temp_shift
+        self._ticks = 0
+
+    def step(self, board: Board, rng: random.Random) -> None:
+        super().step(board, rng)
+        self._ticks += 1
+        if self._ticks != self.broken_tick:
+            return
+        if self.change_material:
+            if board.contents[0][0] != MaterialTypes.WALL:
+                board.contents[0][0] = MaterialTypes.WALL
+            else:
+                board.contents[0][0] = MaterialTypes.METAL
+        board.temps[0][0] += self.temp_shift
+
+
+def self_check(ticks: int = 5, tolerance: float = 1e-6) -> list[str]:
+    """
+    Run the harness against backends that are broken on purpose, and against the
+    reference itself, and return a description of every result that was wrong.
+    """
+    broken_tick = 3
+    cases = [
+        # (description, how to make the candidate, tick the harness should report)
+        ("reference", lambda: ReferenceBackend(), None),
+        (
+            "changed material",
+            lambda: _BrokenBackend(broken_tick, True, 0.0),
+            broken_tick,
+        ),
+        (
+            "temperature outside tolerance",
+            lambda: _BrokenBackend(broken_tick, False, tolerance * 10),
+            broken_tick,
+        ),
+        (
+            "temperature within tolerance",
+            lambda: _BrokenBackend(broken_tick, False, tolerance / 10),
+            None,
+        ),
+    ]
+    problems = []
+    for run in (run_differential, run_order_independent):
+        for description, make_candidate, expected_tick in cases:
+            divergence = run(
+                ReferenceBackend(), make_candidate(), 0, ticks, 16, 16, tolerance
+            )
+            actual_tick = None if divergence is None else divergence.tick
+            if actual_tick != expected_tick:
+                problems.append(
+                    f"{run.__name__} with {description}: expected divergence at tick {expected_tick}, got {divergence}"
+                )
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check a simulation backend against the reference backend"
+    )
+    parser.add_argument("candidate", nargs="?", choices=get_backend_names())
+    parser.add_argument(
+        "--order-independent",
+        action="store_true",
+        help="only compare what does not depend on the order of rng calls",
+    )
+    parser.add_argument(
+        "--self-check",
+        action="store_true",
+        help="check that the harness catches deliberately broken backends",
+    )
+    parser.add_argument("--seeds", type=int, default=10, help="number of seeds")
+    parser.add_argument("--ticks", type=int, default=100, help="ticks per seed")
+    parser.add_argument("--width", type=int, default=32)
+    parser.add_argument("--height", type=int, default=32)
+    parser.add_argument(
+        "--tolerance", type=float, default=1e-6, help="allowed temperature error"
+    )
+    args = parser.parse_args()
+
+    if args.self_check:
+        problems = self_check(tolerance=args.tolerance)
+        for problem in problems:
+            print(problem)
+        print("self check " + ("failed" if problems else "passed"))
+        sys.exit(1 if problems else 0)
+    if args.candidate is None:
+        parser.error("a candidate backend is required unless --self-check is given")
+
+    run = run_order_independent if args.order_independent else run_differential
+    reference = get_backend("reference")
+    candidate = get_backend(args.candidate)
+    failures = 0
+    for seed in range(args.seeds):
+        divergence = run(
+            reference,
+            candidate,
+            seed,
+            args.ticks,
+            args.width,
+            args.height,
+            args.tolerance,
+        )
+        if divergence is None:
+            print(f"seed {seed}: ok")
+        else:
+            failures += 1
+            print(
+                f"seed {seed}: tick {divergence.tick} at ({divergence.x}, {divergence.y}): {divergence.reason}"
+            )
+    print(f"{args.seeds - failures}/{args.seeds} seeds matched the reference backend")
+    sys.exit(1 if failures else 0)
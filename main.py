@@ -1,8 +1,12 @@
+import argparse
 import random
 import pygame
 from pygame import Color
 
-from material import MaterialTypes, DriftTypes, get_material_data
+from backends import SimulationBackend, get_backend, get_backend_names
+from board import Board
+from material import MaterialTypes, get_material_data
+from shared_board import SharedBoardWriter
 
 # Constants
 # The dimensions of the board in cells
@@ -41,6 +45,10 @@ drawing: bool = False
 erasing: bool = False
 temp_overlay: bool = False
 
+# The backend used to advance the board, chosen at startup with --backend
+active_backend: SimulationBackend = get_backend("reference")
+rng: random.Random = random.Random()
+
 
 def get_material_id_at(x: int, y: int) -> MaterialTypes:
     """Get the material at the given coordinates."""
@@ -143,226 +151,13 @@ def draw_ui(screen: pygame.Surface) -> None:
         )
 
 
-def buffer_swap(
-    buffer: list[list[MaterialTypes]],
-    x1: int,
-    y1: int,
-    contents1: MaterialTypes,
-    x2: int,
-    y2: int,
-    contents2: MaterialTypes,
-) -> bool:
-    """
-    Swap two cells in the buffer ONLY IF CLEAN.
-    Returns False if the swap was not possible.
-    """
-    clean1 = (
-        buffer[y1][x1] == MaterialTypes.CLEAN
-    )  # or buffer[y1][x1] == Materials.NONE
-    clean2 = (
-        buffer[y2][x2] == MaterialTypes.CLEAN
-    )  # or buffer[y2][x2] == Materials.NONE
-    if not (clean1 and clean2):
-        return False
-    temp1 = get_temperature(x1, y1)
-    temp2 = get_temperature(x2, y2)
-    buffer[y1][x1] = contents2
-    temps[y1][x1] = temp2
-    buffer[y2][x2] = contents1
-    temps[y2][x2] = temp1
-    return True
-
-
 def tick() -> None:
-    """Update the board state for the next frame."""
+    """Update the board state for the next frame using the active backend."""
     global contents, temps
-    # Temperature conduction
-    temps_buffer = [[None for x in range(BOARD_WIDTH)] for y in range(BOARD_HEIGHT)]
-    for y in range(BOARD_HEIGHT):
-        for x in range(BOARD_WIDTH):
-            material_id = get_material_id_at(x, y)
-            if material_id == MaterialTypes.HEATER:
-                temps_buffer[y][x] = 150.0
-                continue
-            elif material_id == MaterialTypes.COOLER:
-                temps_buffer[y][x] = -50.0
-                continue
-            new_temp = get_temperature(x, y)
-            divisor = 1.0
-            # 10% of the neighboring cells' temperatures are averaged in
-            for dx in range(-1, 2):
-                for dy in range(-1, 2):
-                    if dx == 0 and dy == 0:
-                        continue
-                    neighbor_x = x + dx
-                    neighbor_y = y + dy
-                    neighbor_material_id = get_material_id_at(neighbor_x, neighbor_y)
-                    thermal_conductivity = get_material_data(
-                        neighbor_material_id
-                    ).thermal_conductivity
-                    if thermal_conductivity <= 0:
-                        continue
-                    new_temp += (
-                        get_temperature(neighbor_x, neighbor_y) * thermal_conductivity
-                    )
-                    divisor += thermal_conductivity
-            temps_buffer[y][x] = new_temp / divisor
-    temps = temps_buffer
-    # Melting and freezing
-    for y in range(BOARD_HEIGHT):
-        for x in range(BOARD_WIDTH):
-            old_material_id = get_material_id_at(x, y)
-            old_material = get_material_data(old_material_id)
-            old_temperature = get_temperature(x, y)
-            if old_material.melts_to is not None:
-                if old_temperature >= old_material.melting_point:
-                    # Melt the material
-                    contents[y][x] = old_material.melts_to
-            if old_material.freezes_to is not None:
-                if old_temperature <= old_material.freezing_point:
-                    # Freeze the material
-                    contents[y][x] = old_material.freezes_to
-    # Movement
-    buffer = [
-        [MaterialTypes.CLEAN for _ in range(BOARD_WIDTH)] for _ in range(BOARD_HEIGHT)
-    ]
-    for y in range(BOARD_HEIGHT):
-        left_or_right = random.randint(0, 1)  # Randomly check left or right first
-        for x in (
-            range(BOARD_WIDTH) if left_or_right == 0 else range(BOARD_WIDTH - 1, -1, -1)
-        ):
-            if buffer[y][x] != MaterialTypes.CLEAN:
-                continue
-            old_material_id = get_material_id_at(x, y)
-            old_material = get_material_data(old_material_id)
-            below_material_id = get_material_id_at(x, y + 1)
-            below_material = get_material_data(below_material_id)
-            modified = False
-            if old_material.gravity:
-                # If the material is denser than the one below, swap them
-                if old_material.density > below_material.density:
-                    modified = buffer_swap(
-                        buffer, x, y, old_material_id, x, y + 1, below_material_id
-                    )
-                else:
-                    if random.random() > old_material.friction:
-                        if not modified and old_material.drift in [
-                            DriftTypes.DIAGONAL_DRIFT,
-                            DriftTypes.SIDEWAYS_DRIFT,
-                        ]:
-                            # Drift down diagonally if possible
-                            below_left_contents = get_material_id_at(x - 1, y + 1)
-                            below_right_contents = get_material_id_at(x + 1, y + 1)
-                            below_left_material = get_material_data(below_left_contents)
-                            below_right_material = get_material_data(
-                                below_right_contents
-                            )
-                            # Randomly check left or right first
-                            if random.randint(0, 1) == 0:
-                                if below_left_material.density < old_material.density:
-                                    modified = buffer_swap(
-                                        buffer,
-                                        x,
-                                        y,
-                                        old_material_id,
-                                        x - 1,
-                                        y + 1,
-                                        below_left_contents,
-                                    )
-                                elif (
-                                    below_right_material.density < old_material.density
-                                ):
-                                    modified = buffer_swap(
-                                        buffer,
-                                        x,
-                                        y,
-                                        old_material_id,
-                                        x + 1,
-                                        y + 1,
-                                        below_right_contents,
-                                    )
-                            else:
-                                if below_right_material.density < old_material.density:
-                                    modified = buffer_swap(
-                                        buffer,
-                                        x,
-                                        y,
-                                        old_material_id,
-                                        x + 1,
-                                        y + 1,
-                                        below_right_contents,
-                                    )
-                                elif below_left_material.density < old_material.density:
-                                    modified = buffer_swap(
-                                        buffer,
-                                        x,
-                                        y,
-                                        old_material_id,
-                                        x - 1,
-                                        y + 1,
-                                        below_left_contents,
-                                    )
-                        if not modified and old_material.drift in [
-                            DriftTypes.SIDEWAYS_DRIFT
-                        ]:
-                            # Drift sideways if possible
-                            left_contents = get_material_id_at(x - 1, y)
-                            right_contents = get_material_id_at(x + 1, y)
-                            left_material = get_material_data(left_contents)
-                            right_material = get_material_data(right_contents)
-                            if random.randint(0, 1) == 0:
-                                if left_material.density < old_material.density:
-                                    modified = buffer_swap(
-                                        buffer,
-                                        x,
-                                        y,
-                                        old_material_id,
-                                        x - 1,
-                                        y,
-                                        left_contents,
-                                    )
-                                elif right_material.density < old_material.density:
-                                    modified = buffer_swap(
-                                        buffer,
-                                        x,
-                                        y,
-                                        old_material_id,
-                                        x + 1,
-                                        y,
-                                        right_contents,
-                                    )
-                            else:
-                                if right_material.density < old_material.density:
-                                    modified = buffer_swap(
-                                        buffer,
-                                        x,
-                                        y,
-                                        old_material_id,
-                                        x + 1,
-                                        y,
-                                        right_contents,
-                                    )
-                                elif left_material.density < old_material.density:
-                                    modified = buffer_swap(
-                                        buffer,
-                                        x,
-                                        y,
-                                        old_material_id,
-                                        x - 1,
-                                        y,
-                                        left_contents,
-                                    )
-            # If nothing was modified, keep the old contents.
-            # Materials.NONE should still be clean to allow for later movements.
-            if not modified:
-                buffer[y][x] = (
-                    old_material_id
-                    if old_material_id != MaterialTypes.CLEAN
-                    else MaterialTypes.CLEAN
-                )
-
-    # Swap the buffers
-    contents = buffer
+    board = Board(contents, temps, STARTING_TEMPERATURE)
+    active_backend.step(board, rng)
+    contents = board.contents
+    temps = board.temps
 
 
 def place_material_with_mouse(material: MaterialTypes = None) -> None:
@@ -392,77 +187,116 @@ def place_material_at_cell(x: int, y: int, material: MaterialTypes = None) -> No
 
 
 if __name__ == "__main__":
-    print("Starting main.py")
-    pygame.init()
-    screen: pygame.Surface = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-    board_surface: pygame.Surface = pygame.Surface((BOARD_WIDTH, BOARD_HEIGHT))
-    clock: pygame.time.Clock = pygame.time.Clock()
-    DEFAULT_FONT = pygame.font.SysFont("Arial", 16)
-    OUTLINE_FONT = pygame.font.SysFont("Arial", 16, bold=True)
-    running: bool = True
-
-    initialize_board()
-
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_F1:
-                    temp_overlay = not temp_overlay
-                elif event.key == pygame.K_1:
-                    active_material = MaterialTypes.SAND
-                elif event.key == pygame.K_2:
-                    active_material = MaterialTypes.WATER
-                elif event.key == pygame.K_3:
-                    active_material = MaterialTypes.STONE
-                elif event.key == pygame.K_4:
-                    active_material = MaterialTypes.OIL
-                elif event.key == pygame.K_5:
-                    active_material = MaterialTypes.HELIUM
-                elif event.key == pygame.K_6:
-                    active_material = MaterialTypes.WALL
-                elif event.key == pygame.K_7:
-                    active_material = MaterialTypes.ICE
-                elif event.key == pygame.K_8:
-                    active_material = MaterialTypes.STEAM
-                elif event.key == pygame.K_9:
-                    active_material = MaterialTypes.LIQUID_NITROGEN
-                elif event.key == pygame.K_0:
-                    active_material = MaterialTypes.METAL
-                elif event.key == pygame.K_MINUS:
-                    active_material = MaterialTypes.HEATER
-                elif event.key == pygame.K_EQUALS:
-                    active_material = MaterialTypes.COOLER
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                if event.button == pygame.BUTTON_LEFT:
-                    drawing = True
-                elif event.button == pygame.BUTTON_RIGHT:
-                    erasing = True
-                elif event.button == pygame.BUTTON_WHEELUP:
-                    brush_radius = min(brush_radius + 1, 10)
-                elif event.button == pygame.BUTTON_WHEELDOWN:
-                    brush_radius = max(brush_radius - 1, 0)
-            elif event.type == pygame.MOUSEBUTTONUP:
-                if event.button == pygame.BUTTON_LEFT:
-                    drawing = False
-                elif event.button == pygame.BUTTON_RIGHT:
-                    erasing = False
-        if drawing:
-            place_material_with_mouse()
-        elif erasing:
-            place_material_with_mouse(MaterialTypes.NONE)
-        tick()
-
-        draw_board(board_surface)
-        draw_mouse(board_surface)
-
-        screen.blit(
-            pygame.transform.scale(board_surface, (SCREEN_WIDTH, SCREEN_HEIGHT)), (0, 0)
-        )
-
-        draw_ui(screen)
-
-        pygame.display.flip()
-
-        clock.tick(60)
+    parser = argparse.ArgumentParser(description="Falling sand simulation")
+    parser.add_argument(
+        "--backend",
+        choices=get_backend_names(),
+        default="reference",
+        help="simulation backend used to advance the board",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="seed for the simulation's randomness"
+    )
+    parser.add_argument(
+        "--shared-memory",
+        metavar="NAME",
+        default=None,
+        help="publish the board every frame to the named shared memory segment",
+    )
+    args = parser.parse_args()
+    active_backend = get_backend(args.backend)
+    rng = random.Random(args.seed)
+    shared_board: SharedBoardWriter | None = None
+    if args.shared_memory is not None:
+        try:
+            shared_board = SharedBoardWriter(
+                args.shared_memory, BOARD_WIDTH, BOARD_HEIGHT
+            )
+        except FileExistsError:
+            parser.error(
+                f"shared memory {args.shared_memory!r} already exists, "
+                "is another simulation using it or did one exit without removing it?"
+            )
+
+    try:
+        print(f"Starting main.py with the {active_backend.name} backend")
+        pygame.init()
+        screen: pygame.Surface = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        board_surface: pygame.Surface = pygame.Surface((BOARD_WIDTH, BOARD_HEIGHT))
+        clock: pygame.time.Clock = pygame.time.Clock()
+        DEFAULT_FONT = pygame.font.SysFont("Arial", 16)
+        OUTLINE_FONT = pygame.font.SysFont("Arial", 16, bold=True)
+        running: bool = True
+
+        initialize_board()
+
+        while running:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_F1:
+                        temp_overlay = not temp_overlay
+                    elif event.key == pygame.K_1:
+                        active_material = MaterialTypes.SAND
+                    elif event.key == pygame.K_2:
+                        active_material = MaterialTypes.WATER
+                    elif event.key == pygame.K_3:
+                        active_material = MaterialTypes.STONE
+                    elif event.key == pygame.K_4:
+                        active_material = MaterialTypes.OIL
+                    elif event.key == pygame.K_5:
+                        active_material = MaterialTypes.HELIUM
+                    elif event.key == pygame.K_6:
+                        active_material = MaterialTypes.WALL
+                    elif event.key == pygame.K_7:
+                        active_material = MaterialTypes.ICE
+                    elif event.key == pygame.K_8:
+                        active_material = MaterialTypes.STEAM
+                    elif event.key == pygame.K_9:
+                        active_material = MaterialTypes.LIQUID_NITROGEN
+                    elif event.key == pygame.K_0:
+                        active_material = MaterialTypes.METAL
+                    elif event.key == pygame.K_MINUS:
+                        active_material = MaterialTypes.HEATER
+                    elif event.key == pygame.K_EQUALS:
+                        active_material = MaterialTypes.COOLER
+                elif event.type == pygame.MOUSEBUTTONDOWN:
+                    if event.button == pygame.BUTTON_LEFT:
+                        drawing = True
+                    elif event.button == pygame.BUTTON_RIGHT:
+                        erasing = True
+                    elif event.button == pygame.BUTTON_WHEELUP:
+                        brush_radius = min(brush_radius + 1, 10)
+                    elif event.button == pygame.BUTTON_WHEELDOWN:
+                        brush_radius = max(brush_radius - 1, 0)
+                elif event.type == pygame.MOUSEBUTTONUP:
+                    if event.button == pygame.BUTTON_LEFT:
+                        drawing = False
+                    elif event.button == pygame.BUTTON_RIGHT:
+                        erasing = False
+            if drawing:
+                place_material_with_mouse()
+            elif erasing:
+                place_material_with_mouse(MaterialTypes.NONE)
+            tick()
+            if shared_board is not None:
+                shared_board.publish(Board(contents, temps))
+
+            draw_board(board_surface)
+            draw_mouse(board_surface)
+
+            screen.blit(
+                pygame.transform.scale(board_surface, (SCREEN_WIDTH, SCREEN_HEIGHT)),
+                (0, 0),
+            )
+
+            draw_ui(screen)
+
+            pygame.display.flip()
+
+            clock.tick(60)
+    finally:
+        # Remove the segment even if the loop is interrupted, so readers see a clean shutdown
+        if shared_board is not None:
+            shared_board.close()
@@ -0,0 +1,347 @@
+"""
+Publishes the board through a named shared memory segment, so that other
+processes can watch a running simulation without pickling or copying it
+through a pipe.
+
+Segment layout (little-endian):
+    header     magic, layout version, sequence, tick, width, height
+    materials  width * height signed bytes, the MaterialTypes values, row-major
+    temps      width * height doubles, row-major, 8-byte aligned
+
+The sequence number works like a seqlock: the writer makes it odd before it
+changes the board and even again once it is done. Readers copy the board and
+keep it only if the sequence was even and unchanged across the copy.
+
+Readers either take a consistent copy with snapshot(), or look at the segment
+in place through view(), which avoids the copy but may see a board that is
+halfway through being written.
+
+Usage: python shared_board.py <name>   (prints each new tick of a running simulation)
+       python shared_board.py --self-check   (checks the writer/reader round trip)
+"""
+
+import os
+import struct
+import subprocess
+import sys
+import time
+from array import array
+from collections.abc import Iterator
+from contextlib import contextmanager
+from multiprocessing import shared_memory, resource_tracker
+
+from board import Board
+from material import MaterialTypes
+
+MAGIC = b"SAND"
+LAYOUT_VERSION = 1
+
+# magic, layout version, sequence, tick, width, height
+HEADER = struct.Struct("<4sIQQII")
+SEQUENCE_OFFSET = 8
+TICK_OFFSET = 16
+
+
+def _temps_offset(width: int, height: int) -> int:
+    """Offset of the temperatures, rounded up so the doubles stay aligned."""
+    end_of_materials = HEADER.size + width * height
+    return (end_of_materials + 7) // 8 * 8
+
+
+def segment_size(width: int, height: int) -> int:
+    """Number of bytes needed to share a board of the given size."""
+    return _temps_offset(width, height) + width * height * 8
+
+
+class SharedBoardWriter:
+    """
+    Owns the shared memory segment and copies the board into it every frame.
+    Only one writer may exist per segment.
+    """
+
+    def __init__(self, name: str, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.tick = 0
+        self._sequence = 0
+        self._temps_offset = _temps_offset(width, height)
+        self._shm = shared_memory.SharedMemory(
+            name=name, create=True, size=segment_size(width, height)
+        )
+        HEADER.pack_into(self._shm.buf, 0, MAGIC, LAYOUT_VERSION, 0, 0, width, height)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def publish(self, board: Board) -> None:
+        """Copy the board into the segment and advance the tick counter."""
+        # Convert before taking the lock so readers are blocked for as little as possible
+        material_ids = array(
+            "b", [material.value for row in board.contents for material in row]
+        )
+        temps = array("d", [temp for row in board.temps for temp in row])
+        buf = self._shm.buf
+        cell_count = self.width * self.height
+        self._write_sequence(self._sequence + 1)  # odd: write in progress
+        buf[HEADER.size : HEADER.size + cell_count] = material_ids.tobytes()
+        buf[self._temps_offset : self._temps_offset + cell_count * 8] = temps.tobytes()
+        self.tick += 1
+        struct.pack_into("<Q", buf, TICK_OFFSET, self.tick)
+        self._write_sequence(self._sequence + 1)  # even: consistent again
+
+    def _write_sequence(self, sequence: int) -> None:
+        self._sequence = sequence
+        struct.pack_into("<Q", self._shm.buf, SEQUENCE_OFFSET, sequence)
+
+    def close(self) -> None:
+        """Release and remove the segment. Readers keep their mapping until they close."""
+        self._shm.close()
+        self._shm.unlink()
+
+
+class SharedBoardSnapshot:
+    """A consistent copy of the board taken from shared memory."""
+
+    def __init__(
+        self, tick: int, width: int, height: int, material_ids: array, temps: array
+    ):
+        self.tick = tick
+        self.width = width
+        self.height = height
+        """ MaterialTypes values, row-major """
+        self.material_ids = material_ids
+        """ Temperatures, row-major """
+        self.temps = temps
+
+    def to_board(self) -> Board:
+        """Rebuild a Board from the snapshot."""
+        width = self.width
+        contents = [
+            [
+                MaterialTypes(value)
+                for value in self.material_ids[y * width : (y + 1) * width]
+            ]
+            for y in range(self.height)
+        ]
+        temps = [
+            list(self.temps[y * width : (y + 1) * width]) for y in range(self.height)
+        ]
+        return Board(contents, temps)
+
+    def __repr__(self):
+        return f"SharedBoardSnapshot(tick={self.tick}, width={self.width}, height={self.height})"
+
+
+class SharedBoardReader:
+    """
+    Attaches to a segment created by a SharedBoardWriter in another process.
+    Never writes to the segment.
+    """
+
+    def __init__(self, name: str):
+        self._shm = _attach(name)
+        magic, layout_version, _, _, self.width, self.height = HEADER.unpack_from(
+            self._shm.buf, 0
+        )
+        if magic != MAGIC or layout_version != LAYOUT_VERSION:
+            self._shm.close()
+            raise ValueError(
+                f"Shared memory {name!r} does not hold a board (layout version {LAYOUT_VERSION})"
+            )
+        if self._shm.size < segment_size(self.width, self.height):
+            self._shm.close()
+            raise ValueError(
+                f"Shared memory {name!r} is {self._shm.size} bytes, too small for a {self.width}x{self.height} board"
+            )
+        self._temps_offset = _temps_offset(self.width, self.height)
+
+    @contextmanager
+    def view(self) -> Iterator[memoryview]:
+        """
+        Read-only view of the whole segment, without copying, released on exit.
+        Data read through it may be torn unless checked against sequence().
+        Anything derived from the view (slices, casts) must be released before exit.
+        """
+        view = self._shm.buf.toreadonly()
+        try:
+            yield view
+        finally:
+            view.release()
+
+    def sequence(self) -> int:
+        """The writer's current sequence number. Odd while a write is in progress."""
+        return struct.unpack_from("<Q", self._shm.buf, SEQUENCE_OFFSET)[0]
+
+    def tick(self) -> int:
+        """The number of frames published so far."""
+        return struct.unpack_from("<Q", self._shm.buf, TICK_OFFSET)[0]
+
+    def snapshot(self, timeout: float = 1.0) -> SharedBoardSnapshot:
+        """
+        Copy a consistent board out of the segment, retrying while the writer is busy.
+        Raises TimeoutError if no consistent copy could be taken within the timeout.
+        """
+        buf = self._shm.buf
+        cell_count = self.width * self.height
+        deadline = time.monotonic() + timeout
+        while True:
+            before = self.sequence()
+            if before % 2 == 0:
+                tick = self.tick()
+                material_ids = array("b")
+                material_ids.frombytes(buf[HEADER.size : HEADER.size + cell_count])
+                temps = array("d")
+                temps.frombytes(
+                    buf[self._temps_offset : self._temps_offset + cell_count * 8]
+                )
+                if self.sequence() == before:
+                    return SharedBoardSnapshot(
+                        tick, self.width, self.height, material_ids, temps
+                    )
+            if time.monotonic() > deadline:
+                raise TimeoutError("Timed out waiting for a consistent board")
+            time.sleep(0)
+
+    def close(self) -> None:
+        """Detach from the segment. The writer remains responsible for removing it."""
+        try:
+            self._shm.close()
+        except BufferError:
+            raise BufferError(
+                "Release every view of the shared board before closing the reader"
+            ) from None
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing segment without taking ownership of it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 every attached segment is tracked, and the tracker
+        # would remove it when this process exits, so stop it from doing that.
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def _read_in_subprocess(name: str, timeout: float) -> subprocess.Popen:
+    """
+    Start a process that attaches to the segment, prints "attached", then prints
+    its snapshot as a tuple, or "timeout" if it could not take one.
+    """
+    code = f"""
+from shared_board import SharedBoardReader
+reader = SharedBoardReader({name!r})
+print("attached", flush=True)
+try:
+    snapshot = reader.snapshot(timeout={timeout!r})
+    print((snapshot.tick, snapshot.width, snapshot.height, list(snapshot.material_ids), list(snapshot.temps)))
+except TimeoutError:
+    print("timeout")
+reader.close()
+"""
+    return subprocess.Popen(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+
+
+def self_check() -> list[str]:
+    """
+    Publish a known board and read it back from another process, then check that
+    readers wait while a write is in progress. Returns a description of every problem.
+    """
+    width, height = 8, 4
+    materials = [MaterialTypes.SAND, MaterialTypes.WATER, MaterialTypes.CLEAN]
+    contents = [
+        [materials[(x + y) % len(materials)] for x in range(width)]
+        for y in range(height)
+    ]
+    temps = [[x * 1.5 - y * 100.0 for x in range(width)] for y in range(height)]
+    board = Board(contents, temps)
+    expected = (
+        2,
+        width,
+        height,
+        [material.value for row in contents for material in row],
+        [temp for row in temps for temp in row],
+    )
+
+    problems = []
+    writer = SharedBoardWriter(f"board_self_check_{os.getpid()}", width, height)
+    try:
+        writer.publish(board)
+        writer.publish(board)
+        reader = _read_in_subprocess(writer.name, 1.0)
+        output = reader.communicate()[0].splitlines()
+        if output[-1:] != [repr(expected)]:
+            problems.append(f"round trip: expected {expected}, got {output}")
+
+        # Hold the sequence odd, as if the writer had stopped halfway through a publish
+        writer._write_sequence(writer._sequence + 1)
+        reader = _read_in_subprocess(writer.name, 0.2)
+        output = reader.communicate()[0].splitlines()
+        if output[-1:] != ["timeout"]:
+            problems.append(f"mid-write: expected a timeout, got {output}")
+
+        # Finish the write while a reader is waiting, it should then succeed
+        reader = _read_in_subprocess(writer.name, 5.0)
+        for line in reader.stdout:
+            if line.strip() == "attached":
+                break
+        time.sleep(0.2)
+        writer._write_sequence(writer._sequence + 1)
+        output = reader.communicate()[0].splitlines()
+        if output[-1:] != [repr(expected)]:
+            problems.append(f"retry: expected {expected}, got {output}")
+    finally:
+        writer.close()
+    return problems
+
+
+if __name__ == "__main__":
+    import argparse
+    from collections import Counter
+
+    parser = argparse.ArgumentParser(
+        description="Watch a simulation published to shared memory"
+    )
+    parser.add_argument("name", nargs="?", help="name of the shared memory segment")
+    parser.add_argument(
+        "--self-check",
+        action="store_true",
+        help="check the writer/reader round trip instead of watching",
+    )
+    args = parser.parse_args()
+
+    if args.self_check:
+        problems = self_check()
+        for problem in problems:
+            print(problem)
+        print("self check " + ("failed" if problems else "passed"))
+        sys.exit(1 if problems else 0)
+    if args.name is None:
+        parser.error("a segment name is required unless --self-check is given")
+
+    reader = SharedBoardReader(args.name)
+    last_tick = None
+    try:
+        while True:
+            snapshot = reader.snapshot()
+            if snapshot.tick != last_tick:
+                last_tick = snapshot.tick
+                counts = Counter(
+                    MaterialTypes(value).name for value in snapshot.material_ids
+                )
+                mean_temp = sum(snapshot.temps) / len(snapshot.temps)
+                print(
+                    f"tick {snapshot.tick}: mean temperature {mean_temp:.1f}, {dict(counts)}"
+                )
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()